@@ -1,73 +1,261 @@
+import hashlib
+import time
 from datetime import timedelta
-from django.db.models import Max, Sum, Q, Count
+from django.core.cache import cache
+from django.db.models import Max, Sum, Count, F, Window
+from django.db.models.functions import RowNumber
+from django.http import Http404, HttpResponse
 from django.utils import timezone
-from rest_framework.views import APIView
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+from rest_framework.generics import GenericAPIView
+from rest_framework.views import APIView, exception_handler as drf_exception_handler
 from rest_framework.response import Response
 from rest_framework import status
 
+from .cache import (
+    GLOBAL_FEEDBACK_TTL, MAP_ASSET_CACHE_KEY, MAP_RESPONSE_CACHE_KEY,
+    global_feedback_memo, overview_version,
+)
 from .models import Sensor, SensorHealth, Feedback, MapAsset
+from .renderers import ORJSONRenderer
 from .serializers import (
-    SensorSerializer, SensorHealthSerializer, FeedbackSerializer,
-    MapAssetSerializer, OverviewSerializer
+    SensorSerializer, FeedbackSerializer, SensorsQueryInput, WindowInput,
+    only_for, select_related_for,
 )
 
 
+# 查询参数解析
+_TRUTHY = frozenset({"1", "true", "yes", "on"})
+
+
+def _query_input(serializer_class, request) -> dict:
+    """用输入 Serializer 校验查询参数；空值视同未传，失败抛 ValidationError（400）"""
+    ser = serializer_class(data={k: v for k, v in request.query_params.items() if v})
+    ser.is_valid(raise_exception=True)
+    return ser.validated_data
+
+
 # 统一错误输出：{"error":{"code":"...","message":"..."}}
 def exception_handler(exc, context):
-    from rest_framework.views import exception_handler as drf_handler
-    resp = drf_handler(exc, context)
+    resp = drf_exception_handler(exc, context)
     if resp is None:
         return Response({"error": {"code": "INTERNAL_ERROR", "message": str(exc)}},
                         status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    # 覆盖为统一结构
+    # 覆盖为统一结构；直接改写 DRF 的 resp，保留其 headers（如 WWW-Authenticate）
     message = resp.data
-    if isinstance(message, dict) and "detail" in message:
-        message = message["detail"]
-    return Response({"error": {"code": "BAD_REQUEST", "message": message}}, status=resp.status_code)
+    if isinstance(message, dict):
+        if "error" in message:  # 已是统一结构
+            return resp
+        message = message.get("detail", message)
+    resp.data = {"error": {"code": "BAD_REQUEST", "message": message}}
+    return resp
+
+
+def _query_global_feedback():
+    """
+    最新一条全局反馈（sensor 为空）的输出 dict，无则 None
+    一条 SQL 直接取回所需四列（不再先取 id 再按主键回查）
+    """
+    row = (Feedback.objects
+           .filter(sensor__isnull=True)
+           .order_by("-updated_at", "-id")
+           .values("hot_count", "cold_count", "window", "updated_at")
+           .first())
+    # 与聚合分支同构；窗口分钟数取整除，不走 total_seconds() 浮点运算
+    return {
+        "sensorId": None,
+        "hotCount": row["hot_count"],
+        "coldCount": row["cold_count"],
+        "window": {"minutes": row["window"] // timedelta(minutes=1)},
+        "updatedAt": row["updated_at"],
+    } if row else None
+
+
+def _latest_global_feedback():
+    """
+    _query_global_feedback() 的进程内缓存，有效期 GLOBAL_FEEDBACK_TTL 秒
+    Feedback 保存/删除时由 signals 清空——只清写入所在的进程
+    """
+    now = time.monotonic()
+    hit = global_feedback_memo.get("row")
+    if hit is not None and hit[1] > now:
+        return hit[0]
+    payload = _query_global_feedback()
+    global_feedback_memo["row"] = (payload, now + GLOBAL_FEEDBACK_TTL)
+    return payload
+
+
+# 坐标系元数据（/api/map 与 /api/overview 共用）：固定值，模块加载时构造一次，只读
+COORDINATE_META = {
+    "origin": "top-left",
+    "xAxis": "right",
+    "yAxis": "down",
+}
+
+
+_MISSING = object()
 
 
+def _latest_map_asset_dict():
+    """
+    最新 MapAsset（按 updated_at）的输出 dict，无则为 None
+    地图极少变化，结果放进 cache；MapAsset 保存/删除时由 signals 失效
+    """
+    data = cache.get(MAP_ASSET_CACHE_KEY, _MISSING)
+    if data is not _MISSING:
+        return data
+    r = (MapAsset.objects
+         .order_by("-updated_at", "-id")
+         .values("asset_type", "view_box", "url")
+         .first())
+    data = {"assetType": r["asset_type"], "viewBox": r["view_box"], "url": r["url"]} if r else None
+    cache.set(MAP_ASSET_CACHE_KEY, data, 300)
+    return data
+
+
+# 不分页的大列表（overview）用 iterator() 分块读取（PostgreSQL 下为服务端游标）
+ITER_CHUNK_SIZE = 2000
+
+
+# 只读接口直接走 .values() + 驼峰重命名，绕开 ModelSerializer 的逐字段开销
+# 字段名与对应 Serializer 一致；datetime 原样交给 ORJSONRenderer 输出
+def _sensors_qs():
+    return (Sensor.objects
+            .order_by("sensor_id")
+            .values("sensor_id", "x", "y", "temperature_c", "battery_pct", "last_seen_at"))
+
+
+def _sensor_dict(r) -> dict:
+    return {
+        "sensorId": r["sensor_id"],
+        "x": r["x"],
+        "y": r["y"],
+        "temperatureC": r["temperature_c"],
+        "batteryPct": r["battery_pct"],
+        "lastSeenAt": r["last_seen_at"],
+    }
+
+
+def _health_qs():
+    """健康列表：JOIN sensor 但只取输出用到的列"""
+    return (SensorHealth.objects
+            .order_by("sensor__sensor_id")
+            .values("status", "last_seen_at", "latency_sec", "sensor__sensor_id"))
+
+
+def _health_dict(r) -> dict:
+    return {
+        "sensorId": r["sensor__sensor_id"],
+        "status": r["status"],
+        "lastSeenAt": r["last_seen_at"],
+        "latencySec": r["latency_sec"],
+    }
+
+
+def _sensors_with_health_qs():
+    """
+    overview 用：sensor LEFT JOIN sensor_health，一条 SQL 同时取回两张列表
+    没有健康记录的传感器 health__status 为 None
+    """
+    return (Sensor.objects
+            .order_by("sensor_id")
+            .values("sensor_id", "x", "y", "temperature_c", "battery_pct", "last_seen_at",
+                    "health__status", "health__last_seen_at", "health__latency_sec"))
+
+
+def _compute_feedback(minutes: int = 15, *, memo: bool = True) -> dict:
+    """
+    反馈汇总（/api/feedback 与 /api/overview 共用）
+    - 存在全局反馈（sensor 为空）时优先返回最新一条
+    - 否则对窗口内“每传感器最新一条”求和，单条 SQL 完成
+    - memo=False 时全局反馈直接查库，不用进程内缓存
+    """
+    global_fb = _latest_global_feedback() if memo else _query_global_feedback()
+    if global_fb is not None:
+        return global_fb
+
+    now = timezone.now()
+    since = now - timedelta(minutes=minutes)  # 截止时间只算一次，作为范围条件下推到 DB
+    # 每个传感器按 updated_at 倒序编号，取第 1 条即最新
+    latest_per_sensor = (Feedback.objects
+                         .filter(sensor__isnull=False, updated_at__gte=since)
+                         .annotate(rn=Window(
+                             expression=RowNumber(),
+                             partition_by=[F("sensor_id")],
+                             order_by=[F("updated_at").desc(), F("id").desc()],
+                         ))
+                         .filter(rn=1))
+    # 直接对窗口过滤结果求和（外层 SUM 包住 ROW_NUMBER 子查询），不再 pk__in 回表
+    agg = latest_per_sensor.aggregate(cold=Sum("cold_count"), hot=Sum("hot_count"), latest=Max("updated_at"))
+    return {
+        "sensorId": None,
+        "coldCount": agg["cold"] or 0,
+        "hotCount": agg["hot"] or 0,
+        "window": {"minutes": minutes},
+        "updatedAt": agg["latest"] or now,
+    }
+
+
+def _map_response():
+    """
+    /api/map 的 (JSON 字节, ETag)，渲染一次后放进 cache
+    与 MAP_ASSET_CACHE_KEY 一起由 signals 失效
+    """
+    cached = cache.get(MAP_RESPONSE_CACHE_KEY)
+    if cached is None:
+        body = ORJSONRenderer().render({"map": _latest_map_asset_dict(), "coordinateMeta": COORDINATE_META})
+        cached = (body, hashlib.md5(body, usedforsecurity=False).hexdigest())
+        cache.set(MAP_RESPONSE_CACHE_KEY, cached, 300)
+    return cached
+
+
+def _map_etag(request, *args, **kwargs) -> str:
+    return _map_response()[1]
+
+
+# 装饰在 get 上而不是 dispatch：ETag 计算（冷缓存时会查库）出错也走 exception_handler
+@method_decorator(cache_control(public=True, no_cache=True), name="get")
+@method_decorator(condition(etag_func=_map_etag), name="get")
 class MapView(APIView):
     """
     GET /api/map
     - 返回最新 MapAsset（按 updated_at）
     - 附带坐标系元数据（origin/axis）
+    - 带 ETag；If-None-Match 命中时返回 304，无响应体
+    - 内容几乎不变：直接返回预渲染的字节，不经过 DRF 渲染；405/500 等错误仍是统一的错误结构
     """
     def get(self, request):
-        asset = MapAsset.objects.order_by("-updated_at", "-id").first()
-        data = MapAssetSerializer(asset).data if asset else None
-        meta = {
-            "coordinateMeta": {
-                "origin": "top-left",
-                "xAxis": "right",
-                "yAxis": "down"
-            }
-        }
-        return Response({"map": data, **meta})
+        body, _ = _map_response()
+        return HttpResponse(body, content_type=ORJSONRenderer.media_type)
 
 
-class SensorsView(APIView):
+class SensorsView(GenericAPIView):
     """
     GET /api/sensors
-    - 返回全部传感器（可按 ?updatedWithin=minutes 过滤）
+    - 返回传感器列表（可按 ?updatedWithin=minutes 过滤）
+    - 分页：?limit=&offset=，默认每页 PAGE_SIZE 条
     """
     def get_object(self, sensor_id: str) -> Sensor:
+        # 只取 SensorSerializer 读写的列；updated_at 须一并加载，save() 才会写回 auto_now
         try:
-            return Sensor.objects.get(sensor_id=sensor_id)
+            return only_for(Sensor.objects.all(), SensorSerializer, "updated_at").get(sensor_id=sensor_id)
         except Sensor.DoesNotExist:
             raise Http404
 
+    def get_queryset(self):
+        return _sensors_qs()
+
     def get(self, request):
-        qs = Sensor.objects.all().order_by("sensor_id")
-        minutes = request.query_params.get("updatedWithin")
-        if minutes:
-            try:
-                m = int(minutes)
-                since = timezone.now() - timedelta(minutes=m)
-                qs = qs.filter(last_seen_at__gte=since)
-            except ValueError:
-                return Response({"error": {"code": "BAD_REQUEST", "message": "updatedWithin must be integer minutes"}},
-                                status=status.HTTP_400_BAD_REQUEST)
-        return Response(SensorSerializer(qs, many=True).data)
+        qs = self.get_queryset()
+        minutes = _query_input(SensorsQueryInput, request).get("updatedWithin")
+        if minutes is not None:
+            # 截止时间只算一次，走 last_seen_at 索引做范围过滤
+            since = timezone.now() - timedelta(minutes=minutes)
+            qs = qs.filter(last_seen_at__gte=since)
+        page = self.paginate_queryset(qs)
+        return self.get_paginated_response([_sensor_dict(r) for r in page])
     
     def put(self, request, sensor_id: str):
         """
@@ -95,34 +283,48 @@ class SensorsView(APIView):
 
 
 
-class HealthView(APIView):
+class HealthView(GenericAPIView):
+    """
+    GET /api/health                  -> 健康列表（分页：?limit=&offset=）
+    GET /api/health?aggregate=true   -> 各状态计数
+    """
+    def get_queryset(self):
+        return _health_qs()
+
     def get(self, request):
-        if request.query_params.get("aggregate") in ("1", "true", "True"):
-            # 简单直接的计数法，最不容易出错
-            connected = SensorHealth.objects.filter(status="connected").count()
-            disconnected = SensorHealth.objects.filter(status="disconnected").count()
-            return Response({"counts": {"connected": connected, "disconnected": disconnected}})
+        if (request.query_params.get("aggregate") or "").lower() in _TRUTHY:
+            # 一条 GROUP BY status，DB 只回每种状态一行；没有出现的状态补 0
+            rows = SensorHealth.objects.order_by().values("status").annotate(n=Count("id"))
+            counts = dict.fromkeys(SensorHealth.Status.values, 0)
+            counts.update((r["status"], r["n"]) for r in rows)
+            return Response({"counts": counts})
 
-        qs = SensorHealth.objects.select_related("sensor").order_by("sensor__sensor_id")
-        return Response(SensorHealthSerializer(qs, many=True).data)
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response([_health_dict(r) for r in page])
 
 
 
 class FeedbackView(APIView):
     """
-    GET  /api/feedback          -> 返回全部 feedback 列表（仅 sensorId/hotCount/coldCount）
+    GET  /api/feedback          -> 返回反馈汇总（全局优先，否则聚合各传感器最新一条）
+                                   ?window=minutes 聚合窗口，1..1440，默认 15
     PUT  /api/feedback/<pk>     -> 更新指定 feedback 的上述字段（允许部分字段）
     """
 
+    def get_queryset(self):
+        # FeedbackSerializer 读 sensor.sensor_id，JOIN 随之带上
+        # only() 按同一份 source 收窄 SELECT；延迟加载的实例 save() 也只 UPDATE 已加载的列
+        return select_related_for(only_for(Feedback.objects.all(), FeedbackSerializer), FeedbackSerializer)
+
     def get_object(self, pk: int) -> Feedback:
         try:
-            return Feedback.objects.select_related("sensor").get(pk=pk)
+            return self.get_queryset().get(pk=pk)
         except Feedback.DoesNotExist:
             raise Http404
 
     def get(self, request):
-        qs = Feedback.objects.select_related("sensor").order_by("id")
-        return Response(FeedbackSerializer(qs, many=True).data, status=status.HTTP_200_OK)
+        minutes = _query_input(WindowInput, request)["window"]
+        return Response(_compute_feedback(minutes), status=status.HTTP_200_OK)
 
     def put(self, request, pk: int):
         obj = self.get_object(pk)
@@ -133,6 +335,17 @@ class FeedbackView(APIView):
         return Response(FeedbackSerializer(obj).data, status=status.HTTP_200_OK)
 
 
+OVERVIEW_CACHE_TTL = 60
+
+
+def _overview_cache_key() -> str:
+    """
+    数据版本号存在 cache 里，Sensor/SensorHealth/Feedback/MapAsset 保存/删除时由 signals 递增；
+    命中路径不查库。反馈滑出时间窗口不会改变版本号，由 OVERVIEW_CACHE_TTL 兜底
+    """
+    return f"overview:v{overview_version()}"
+
+
 class OverviewView(APIView):
     """
     GET /api/overview  （可选，方便前端一次拿全量）
@@ -142,60 +355,46 @@ class OverviewView(APIView):
       "health": [...],
       "feedback": {...}
     }
+    数据未变化时直接返回缓存的 JSON 字节，不再组装、不走 DRF 渲染
+    多进程部署注意：版本号与缓存字节都放在 CACHES 里。默认的 LocMemCache 每个进程各一份，
+    别的进程处理的写入不会让本进程的版本号变化，本进程最多返回 OVERVIEW_CACHE_TTL 秒的旧数据；
+    需要跨进程即时一致时，把 CACHES 换成共享后端（memcached 等）
     """
     def get(self, request):
-        asset = MapAsset.objects.order_by("-updated_at", "-id").first()
-        sensors = Sensor.objects.all().order_by("sensor_id")
-        health = SensorHealth.objects.select_related("sensor").order_by("sensor__sensor_id")
-
-        # 反馈：沿用 /api/feedback 的逻辑
-        global_fb = (Feedback.objects
-                     .filter(sensor__isnull=True)
-                     .order_by("-updated_at", "-id")
-                     .first())
-        if global_fb:
-            fb_payload = FeedbackSerializer(global_fb).data
-        else:
-            minutes = 15
-            since = timezone.now() - timedelta(minutes=minutes)
-            latest_per_sensor = (Feedback.objects
-                                 .filter(sensor__isnull=False, updated_at__gte=since)
-                                 .values("sensor_id")
-                                 .annotate(latest=Max("updated_at")))
-            if latest_per_sensor:
-                q = Q()
-                for row in latest_per_sensor:
-                    q |= Q(sensor_id=row["sensor_id"], updated_at=row["latest"])
-                selected = Feedback.objects.filter(q)
-                cold = selected.aggregate(s=Sum("cold_count"))["s"] or 0
-                hot = selected.aggregate(s=Sum("hot_count"))["s"] or 0
-                latest = selected.aggregate(m=Max("updated_at"))["m"] or timezone.now()
-                fb_payload = {
-                    "sensorId": None,
-                    "coldCount": cold,
-                    "hotCount": hot,
-                    "window": {"minutes": minutes},
-                    "updatedAt": latest,
-                }
-            else:
-                fb_payload = {
-                    "sensorId": None,
-                    "coldCount": 0,
-                    "hotCount": 0,
-                    "window": {"minutes": 15},
-                    "updatedAt": timezone.now(),
-                }
+        key = _overview_cache_key()
+        payload = cache.get(key)
+        if payload is not None:
+            return HttpResponse(payload, content_type=ORJSONRenderer.media_type)
+
+        # 版本号在组装前取：组装期间若有写入，新版本号会指向别的 key，不会被这份旧数据占住
+        payload = ORJSONRenderer().render(self._build())
+        cache.set(key, payload, OVERVIEW_CACHE_TTL)
+        return HttpResponse(payload, content_type=ORJSONRenderer.media_type)
+
+    def _build(self) -> dict:
+        # 传感器与健康一条 LEFT JOIN 取回，按块流式读取并直接转换；地图走缓存
+        # 两张列表都按 sensor_id 排序，与 /api/sensors、/api/health 一致
+        sensors, health = [], []
+        for r in _sensors_with_health_qs().iterator(chunk_size=ITER_CHUNK_SIZE):
+            sensors.append(_sensor_dict(r))
+            if r["health__status"] is not None:
+                health.append({
+                    "sensorId": r["sensor_id"],
+                    "status": r["health__status"],
+                    "lastSeenAt": r["health__last_seen_at"],
+                    "latencySec": r["health__latency_sec"],
+                })
+
+        # 反馈：沿用 /api/feedback 的逻辑，但不用进程内缓存——
+        # 别的进程写入后版本号已变，这里若读到本进程的旧缓存，会以新 key 存下旧数据
+        fb_payload = _compute_feedback(memo=False)
 
         # 这里直接拼装最终响应（全部已是“可序列化”的 dict）
         data = {
-            "map": MapAssetSerializer(asset).data if asset else None,
-            "sensors": SensorSerializer(sensors, many=True).data,
-            "health": SensorHealthSerializer(health, many=True).data,
+            "map": _latest_map_asset_dict(),
+            "sensors": sensors,
+            "health": health,
             "feedback": fb_payload,
-            "coordinateMeta": {
-                "origin": "top-left",
-                "xAxis": "right",
-                "yAxis": "down",
-            },
+            "coordinateMeta": COORDINATE_META,
         }
-        return Response(data)
+        return data
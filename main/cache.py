@@ -0,0 +1,31 @@
+"""
+缓存 key 与失效入口
+api 读取，signals / serializers 在写入后失效；单独成模块，serializers 不必反向依赖 api
+"""
+import time
+
+from django.core.cache import cache
+
+MAP_ASSET_CACHE_KEY = "map_asset:latest"
+MAP_RESPONSE_CACHE_KEY = "map_asset:response"
+OVERVIEW_VERSION_KEY = "overview:version"
+
+# 最新全局反馈的进程内缓存 {"row": (payload, 过期时刻)}，由 api._latest_global_feedback 读写
+GLOBAL_FEEDBACK_TTL = 1.0
+global_feedback_memo = {}
+
+
+def invalidate_global_feedback():
+    global_feedback_memo.clear()
+
+
+def overview_version() -> int:
+    # 初值取纳秒时间戳：计数器被淘汰后重建，不会撞上旧版本的 key
+    return cache.get_or_set(OVERVIEW_VERSION_KEY, time.time_ns, None)
+
+
+def bump_overview_version():
+    try:
+        cache.incr(OVERVIEW_VERSION_KEY)
+    except ValueError:  # 计数器不存在（未初始化或已被淘汰）
+        cache.set(OVERVIEW_VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.18 on 2026-10-14 18:34
+
+import datetime
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MapAsset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('asset_type', models.CharField(choices=[('svg', 'svg'), ('png', 'png'), ('jpg', 'jpg')], db_index=True, max_length=8)),
+                ('view_box', models.JSONField(blank=True, help_text='仅 SVG 使用的视窗，如 [0,0,1000,700]', null=True)),
+                ('url', models.CharField(max_length=512)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'map_asset',
+                'ordering': ['-updated_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Sensor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sensor_id', models.CharField(db_index=True, help_text='业务侧的传感器ID，如 S-001', max_length=64, unique=True)),
+                ('x', models.FloatField(help_text='本地坐标 x（0..1 或 SVG 单位）')),
+                ('y', models.FloatField(help_text='本地坐标 y（0..1 或 SVG 单位）')),
+                ('temperature_c', models.FloatField(help_text='温度（摄氏度）')),
+                ('battery_pct', models.PositiveSmallIntegerField(blank=True, help_text='电量百分比，可为空', null=True)),
+                ('last_seen_at', models.DateTimeField(db_index=True, help_text='最近一次上报时间（UTC ISO8601）')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'sensor',
+                'ordering': ['sensor_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SensorHealth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('connected', 'connected'), ('disconnected', 'disconnected')], db_index=True, max_length=16)),
+                ('last_seen_at', models.DateTimeField(db_index=True, help_text='最近一次上报时间（与 Sensor.last_seen_at 对齐）')),
+                ('latency_sec', models.PositiveIntegerField(help_text='当前估算的延迟（秒）')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('sensor', models.OneToOneField(help_text='关联的传感器', on_delete=django.db.models.deletion.CASCADE, related_name='health', to='main.sensor')),
+            ],
+            options={
+                'db_table': 'sensor_health',
+            },
+        ),
+        migrations.CreateModel(
+            name='Feedback',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cold_count', models.PositiveIntegerField(default=0)),
+                ('hot_count', models.PositiveIntegerField(default=0)),
+                ('window', models.DurationField(default=datetime.timedelta(seconds=900), help_text='聚合窗口大小（默认15分钟）')),
+                ('updated_at', models.DateTimeField(db_index=True, help_text='本条聚合的更新时间（UTC ISO8601）')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False)),
+                ('sensor', models.ForeignKey(blank=True, help_text='可选：按传感器维度的反馈聚合', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='feedbacks', to='main.sensor')),
+            ],
+            options={
+                'db_table': 'feedback',
+                'indexes': [models.Index(fields=['updated_at'], name='feedback_updated_c56034_idx'), models.Index(fields=['sensor', 'updated_at'], name='feedback_sensor__228d88_idx'), models.Index(fields=['sensor', '-updated_at'], name='fb_sensor_updated_desc'), models.Index(condition=models.Q(('sensor__isnull', True)), fields=['-updated_at'], name='fb_global_latest')],
+            },
+        ),
+    ]
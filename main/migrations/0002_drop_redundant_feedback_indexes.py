@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-14 18:41
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='feedback',
+            name='feedback_updated_c56034_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='feedback',
+            name='feedback_sensor__228d88_idx',
+        ),
+    ]
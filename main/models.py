@@ -111,9 +111,13 @@ class Feedback(models.Model):
 
     class Meta:
         db_table = "feedback"
+        # updated_at 单列索引由 db_index=True 提供；(sensor, updated_at) 由下方倒序索引覆盖
         indexes = [
-            models.Index(fields=["updated_at"]),
-            models.Index(fields=["sensor", "updated_at"]),
+            # 每传感器最新一条：ORDER BY sensor_id, updated_at DESC
+            models.Index(fields=["sensor", "-updated_at"], name="fb_sensor_updated_desc"),
+            # 全局反馈（sensor 为空）的最新一条
+            models.Index(fields=["-updated_at"], condition=models.Q(sensor__isnull=True),
+                         name="fb_global_latest"),
         ]
 
     def __str__(self) -> str:
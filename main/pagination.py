@@ -0,0 +1,9 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class BoundedLimitOffsetPagination(LimitOffsetPagination):
+    """
+    ?limit=&offset= 分页，默认每页 PAGE_SIZE 条
+    - DRF 默认 max_limit 为 None，?limit= 传很大的值就等于不分页；超出 max_limit 时按 max_limit 截断
+    """
+    max_limit = 1000
@@ -0,0 +1,23 @@
+import orjson
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(BaseRenderer):
+    """
+    基于 orjson 的 JSON 渲染器（替代 rest_framework.renderers.JSONRenderer）
+    - datetime 由 orjson 直接输出，格式与 DATETIME_FORMAT（%Y-%m-%dT%H:%M:%SZ）一致
+    - orjson 不认识的类型（Decimal、惰性翻译字符串等）交回 DRF 的 JSONEncoder 处理
+    """
+    media_type = "application/json"
+    format = "json"
+    charset = None
+
+    options = (orjson.OPT_UTC_Z | orjson.OPT_OMIT_MICROSECONDS
+               | orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS)
+    _fallback = JSONEncoder().default
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=self._fallback, option=self.options)
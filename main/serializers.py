@@ -1,7 +1,67 @@
+from collections.abc import Mapping
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
 from rest_framework import serializers
+from rest_framework.fields import empty
+from .cache import bump_overview_version, invalidate_global_feedback
 from .models import Sensor, SensorHealth, Feedback, MapAsset
 from django.utils import timezone
 
+
+@lru_cache(maxsize=None)
+def _related_paths(serializer_class) -> tuple:
+    paths = set()
+    for field in serializer_class().fields.values():
+        parts = field.source.split(".")[:-1]  # "sensor.sensor_id" -> ["sensor"]
+        if parts:
+            paths.add("__".join(parts))
+    return tuple(sorted(paths))
+
+
+def select_related_for(queryset, serializer_class):
+    """
+    按 Serializer 声明的点号 source（如 sensor.sensor_id）推导 select_related，
+    新增跨表字段时 JOIN 自动跟上，不会悄悄变成 N+1
+    """
+    paths = _related_paths(serializer_class)
+    return queryset.select_related(*paths) if paths else queryset
+
+
+@lru_cache(maxsize=None)
+def _column_paths(model, serializer_class) -> tuple:
+    paths = set()
+    for field in serializer_class().fields.values():
+        if field.source == "*":
+            continue
+        # 沿 source 逐段解析模型字段："sensor.sensor_id" -> "sensor"、"sensor__sensor_id"
+        # （外键本身须加载，select_related 才能走）；遇到属性、方法、反向/多对多关系即停，only() 只认具体列
+        current, parts = model, []
+        for name in field.source.split("."):
+            try:
+                f = current._meta.get_field(name)
+            except FieldDoesNotExist:
+                break
+            if not f.concrete or f.many_to_many:
+                break
+            parts.append(name)
+            paths.add("__".join(parts))
+            if not f.is_relation:
+                break
+            current = f.related_model
+    return tuple(sorted(paths))
+
+
+def only_for(queryset, serializer_class, *extra):
+    """
+    按 Serializer 声明的 source 推导 only()，与 select_related_for 配合使用；
+    新增字段（含跨表字段）时加载的列自动跟上，不会变成延迟加载的额外查询
+    属性/方法类 source 不对应数据库列，跳过；它们读到的延迟列需经 extra 显式加载
+    extra 为 Serializer 之外还需加载的列（如 save() 要写回的 auto_now 字段）
+    """
+    return queryset.only(*_column_paths(queryset.model, serializer_class), *extra)
+
+
 class SensorSerializer(serializers.ModelSerializer):
     sensorId = serializers.CharField(source="sensor_id")
     temperatureC = serializers.FloatField(source="temperature_c")
@@ -38,8 +98,15 @@ class SensorHealthSerializer(serializers.ModelSerializer):
         fields = ("sensorId", "status", "lastSeenAt", "latencySec")
 
 
-class _WindowSerializer(serializers.Serializer):
-    minutes = serializers.IntegerField()
+# 查询参数校验（模块级定义，字段只构建一次）
+class WindowInput(serializers.Serializer):
+    """GET /api/feedback?window=minutes"""
+    window = serializers.IntegerField(required=False, default=15, min_value=1, max_value=1440)
+
+
+class SensorsQueryInput(serializers.Serializer):
+    """GET /api/sensors?updatedWithin=minutes"""
+    updatedWithin = serializers.IntegerField(required=False, min_value=0, max_value=525600)  # 最长一年
 
 
 class FeedbackSerializer(serializers.ModelSerializer):
@@ -53,13 +120,28 @@ class FeedbackSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         # 处理 sensorId（可选）
-        sensor_data = validated_data.pop("sensor", None)  # 来自 source="sensor.sensor_id"
+        sensor_data = validated_data.get("sensor") or {}  # 来自 source="sensor.sensor_id"
+        sensors = self._sensor_map({sensor_data["sensor_id"]} if "sensor_id" in sensor_data else set())
+        self._apply(instance, validated_data, sensors)
+        instance.save()
+        return instance
+
+    @staticmethod
+    def _sensor_map(sids):
+        """{sensor_id: Sensor}；只需要主键即可挂外键，不必取整行"""
+        if not sids:
+            return {}
+        return Sensor.objects.only("id", "sensor_id").filter(sensor_id__in=sids).in_bulk(field_name="sensor_id")
+
+    @staticmethod
+    def _apply(instance, validated_data, sensors):
+        """把校验后的数据写到 instance 上；sensors 为 {sensor_id: Sensor} 预取结果"""
+        sensor_data = validated_data.get("sensor")
         if sensor_data and "sensor_id" in sensor_data:
             sid = sensor_data["sensor_id"]
-            try:
-                instance.sensor = Sensor.objects.get(sensor_id=sid)
-            except Sensor.DoesNotExist:
+            if sid not in sensors:
                 raise serializers.ValidationError({"sensorId": "Sensor not found."})
+            instance.sensor = sensors[sid]
 
         # 处理计数
         if "hot_count" in validated_data:
@@ -67,8 +149,46 @@ class FeedbackSerializer(serializers.ModelSerializer):
         if "cold_count" in validated_data:
             instance.cold_count = validated_data["cold_count"]
 
-        instance.save()
-        return instance
+    @classmethod
+    def bulk_apply(cls, updates):
+        """
+        批量更新：updates 为 [{"id": 1, "sensorId": "S-001", "hotCount": 3}, ...]
+        Sensor 与 Feedback 各一次性预取，最后一条 bulk_update 写回，
+        避免循环中逐条 Sensor.objects.get / save 的 N+1
+        任一条校验失败抛 ValidationError，整批不写入
+        bulk_update 不触发 post_save，缓存失效在这里显式做
+        """
+        updates = list(updates)
+        pk_field = serializers.IntegerField(min_value=1)
+        if not all(isinstance(u, Mapping) for u in updates):
+            raise serializers.ValidationError("Each update must be an object.")
+        try:
+            ids = [pk_field.run_validation(u.get("id", empty)) for u in updates]
+        except serializers.ValidationError as exc:
+            raise serializers.ValidationError({"id": exc.detail})
+        feedbacks = Feedback.objects.in_bulk(ids)
+
+        validated = []
+        for pk, u in zip(ids, updates):
+            instance = feedbacks.get(pk)
+            if instance is None:
+                raise serializers.ValidationError({"id": f"Feedback {pk} not found."})
+            ser = cls(instance, data=u, partial=True)
+            ser.is_valid(raise_exception=True)
+            validated.append((instance, ser.validated_data))
+
+        sensors = cls._sensor_map({
+            data["sensor"]["sensor_id"] for _, data in validated if "sensor_id" in data.get("sensor", {})
+        })
+        for instance, data in validated:
+            cls._apply(instance, data, sensors)
+
+        changed = [instance for instance, _ in validated]
+        if changed:
+            Feedback.objects.bulk_update(changed, ["sensor", "hot_count", "cold_count"])
+            invalidate_global_feedback()
+            bump_overview_version()
+        return changed
 
 
 class MapAssetSerializer(serializers.ModelSerializer):
@@ -0,0 +1,27 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import MAP_ASSET_CACHE_KEY, MAP_RESPONSE_CACHE_KEY, bump_overview_version, invalidate_global_feedback
+from .models import Feedback, MapAsset, Sensor, SensorHealth
+
+
+@receiver([post_save, post_delete], sender=MapAsset)
+def invalidate_map_asset_cache(sender, **kwargs):
+    # 地图上传/替换/删除后，下次请求重新读取
+    cache.delete_many([MAP_ASSET_CACHE_KEY, MAP_RESPONSE_CACHE_KEY])
+
+
+@receiver([post_save, post_delete], sender=Feedback)
+def invalidate_global_feedback_cache(sender, **kwargs):
+    # 任一反馈变化都可能改变“最新全局反馈”，直接清空
+    invalidate_global_feedback()
+
+
+@receiver([post_save, post_delete], sender=Sensor)
+@receiver([post_save, post_delete], sender=SensorHealth)
+@receiver([post_save, post_delete], sender=Feedback)
+@receiver([post_save, post_delete], sender=MapAsset)
+def invalidate_overview_cache(sender, **kwargs):
+    # overview 汇总了这四张表，任一写入都换版本号，旧 key 自然作废
+    bump_overview_version()
@@ -1,112 +1,283 @@
 from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APITestCase
-from rest_framework import status
+from rest_framework import serializers, status
+from rest_framework.exceptions import ValidationError
 
+from main.cache import OVERVIEW_VERSION_KEY, bump_overview_version, invalidate_global_feedback
 from main.models import Sensor, SensorHealth, Feedback, MapAsset
+from main.pagination import BoundedLimitOffsetPagination
+from main.serializers import (
+    FeedbackSerializer, SensorSerializer, SensorHealthSerializer, MapAssetSerializer,
+    only_for, select_related_for,
+)
 
 
 class APISmokeTests(APITestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
+        # 类级别数据只写一次；每个用例结束回滚到这里，无需重复 INSERT
         # 基础时间
-        self.now = timezone.now()
+        cls.now = timezone.now()
 
         # 地图
-        self.asset = MapAsset.objects.create(
+        cls.asset = MapAsset.objects.create(
             asset_type="svg",
             view_box=[0, 0, 1000, 700],
             url="/assets/maps/placeholder.svg",
         )
 
         # 传感器
-        self.s1 = Sensor.objects.create(
-            sensor_id="S-001",
-            x=0.12, y=0.45,
-            temperature_c=23.5,
-            battery_pct=85,
-            last_seen_at=self.now - timedelta(seconds=20),
-        )
-        self.s2 = Sensor.objects.create(
-            sensor_id="S-002",
-            x=0.72, y=0.15,
-            temperature_c=26.1,
-            battery_pct=None,
-            last_seen_at=self.now - timedelta(minutes=30),
-        )
+        cls.s1, cls.s2 = Sensor.objects.bulk_create([
+            Sensor(
+                sensor_id="S-001",
+                x=0.12, y=0.45,
+                temperature_c=23.5,
+                battery_pct=85,
+                last_seen_at=cls.now - timedelta(seconds=20),
+            ),
+            Sensor(
+                sensor_id="S-002",
+                x=0.72, y=0.15,
+                temperature_c=26.1,
+                battery_pct=None,
+                last_seen_at=cls.now - timedelta(minutes=30),
+            ),
+        ])
 
         # 健康
-        SensorHealth.objects.create(
-            sensor=self.s1,
-            status="connected",
-            last_seen_at=self.s1.last_seen_at,
-            latency_sec=12,
-        )
-        SensorHealth.objects.create(
-            sensor=self.s2,
-            status="disconnected",
-            last_seen_at=self.s2.last_seen_at,
-            latency_sec=999,
-        )
+        SensorHealth.objects.bulk_create([
+            SensorHealth(
+                sensor=cls.s1,
+                status="connected",
+                last_seen_at=cls.s1.last_seen_at,
+                latency_sec=12,
+            ),
+            SensorHealth(
+                sensor=cls.s2,
+                status="disconnected",
+                last_seen_at=cls.s2.last_seen_at,
+                latency_sec=999,
+            ),
+        ])
 
         # 反馈：每传感器最新一条
-        Feedback.objects.create(
-            sensor=self.s1,
-            cold_count=2,
-            hot_count=1,
-            updated_at=self.now - timedelta(minutes=1),
-        )
-        Feedback.objects.create(
-            sensor=self.s2,
-            cold_count=1,
-            hot_count=0,
-            updated_at=self.now - timedelta(minutes=2),
-        )
+        Feedback.objects.bulk_create([
+            Feedback(
+                sensor=cls.s1,
+                cold_count=2,
+                hot_count=1,
+                updated_at=cls.now - timedelta(minutes=1),
+            ),
+            Feedback(
+                sensor=cls.s2,
+                cold_count=1,
+                hot_count=0,
+                updated_at=cls.now - timedelta(minutes=2),
+            ),
+        ])
         # 可选：全局聚合一条（若存在，将优先被 /api/feedback 返回）
         # Feedback.objects.create(
         #     sensor=None,
         #     cold_count=10,
         #     hot_count=5,
-        #     updated_at=self.now - timedelta(seconds=10),
+        #     updated_at=cls.now - timedelta(seconds=10),
         # )
 
+    def setUp(self):
+        # 缓存不随测试事务回滚（bulk_create 也不触发失效信号），每个用例从冷缓存开始
+        cache.clear()
+        invalidate_global_feedback()
+
     def test_map(self):
         url = "/api/map"
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertIn("map", resp.data)
-        self.assertEqual(resp.data["map"]["assetType"], "svg")
-        self.assertEqual(resp.data["map"]["viewBox"], [0, 0, 1000, 700])
-        self.assertIn("coordinateMeta", resp.data)
-        self.assertEqual(resp.data["coordinateMeta"]["origin"], "top-left")
+        self.assertEqual(resp["Content-Type"], "application/json")
+        data = resp.json()  # 预渲染字节，不是 DRF Response
+        self.assertIn("map", data)
+        self.assertEqual(data["map"]["assetType"], "svg")
+        self.assertEqual(data["map"]["viewBox"], [0, 0, 1000, 700])
+        self.assertIn("coordinateMeta", data)
+        self.assertEqual(data["coordinateMeta"]["origin"], "top-left")
+
+    def test_map_errors_use_standard_format(self):
+        resp = self.client.post("/api/map")
+        self.assertEqual(resp.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+        self.assertEqual(resp["Content-Type"], "application/json")
+        self.assertEqual(resp.json()["error"]["code"], "BAD_REQUEST")
+        # 冷缓存下取 ETag 时查库出错，也应是统一的 JSON 错误
+        with mock.patch("main.api._latest_map_asset_dict", side_effect=RuntimeError("db down")):
+            resp = self.client.get("/api/map")
+        self.assertEqual(resp.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(resp.json()["error"], {"code": "INTERNAL_ERROR", "message": "db down"})
+
+    def test_map_etag_not_modified(self):
+        resp = self.client.get("/api/map")
+        etag = resp["ETag"]
+        self.assertIn("no-cache", resp["Cache-Control"])
+        resp = self.client.get("/api/map", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        # 地图更新后 ETag 随之变化
+        self.asset.url = "/assets/maps/v2.svg"
+        self.asset.save()
+        resp = self.client.get("/api/map", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp["ETag"], etag)
+
+    def test_gzip_when_accepted(self):
+        resp = self.client.get("/api/overview", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp["Content-Encoding"], "gzip")
+        # 压缩后的 ETag 变为弱校验，条件请求仍能命中 304
+        resp = self.client.get("/api/map", HTTP_ACCEPT_ENCODING="gzip")
+        etag = resp["ETag"]
+        resp = self.client.get("/api/map", HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
 
     def test_sensors_all(self):
         url = "/api/sensors"
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 2)
+        self.assertEqual(len(resp.data["results"]), 2)
         # 字段风格校验（驼峰）
-        s = resp.data[0]
+        s = resp.data["results"][0]
         self.assertIn("sensorId", s)
         self.assertIn("temperatureC", s)
         self.assertIn("lastSeenAt", s)
 
+    def test_sensors_pagination(self):
+        resp = self.client.get("/api/sensors?limit=1&offset=1")
+        self.assertEqual(resp.data["count"], 2)
+        self.assertEqual([x["sensorId"] for x in resp.data["results"]], ["S-002"])
+        self.assertIsNone(resp.data["next"])
+
+    def test_pagination_limit_is_capped(self):
+        with mock.patch.object(BoundedLimitOffsetPagination, "max_limit", 1):
+            resp = self.client.get("/api/sensors?limit=100000000")
+        self.assertEqual(len(resp.data["results"]), 1)
+        self.assertIsNotNone(resp.data["next"])
+        self.assertEqual(BoundedLimitOffsetPagination.max_limit, 1000)
+
     def test_sensors_filter_updated_within(self):
         # 只应返回 10 分钟内更新的传感器（S-001）
         url = "/api/sensors?updatedWithin=10"
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        ids = {x["sensorId"] for x in resp.data}
+        ids = {x["sensorId"] for x in resp.data["results"]}
         self.assertSetEqual(ids, {"S-001"})
 
+    def test_sensors_fetch_only_output_columns(self):
+        # 只取输出用到的列，created_at / updated_at 不应出现在 SELECT 里
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/sensors")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertIn("last_seen_at", sql)
+        self.assertNotIn("created_at", sql)
+        self.assertNotIn("updated_at", sql)
+
+    def test_feedback_put_touches_only_serializer_columns(self):
+        fb = Feedback.objects.get(sensor=self.s1)
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.put(f"/api/feedback/{fb.pk}", {"hotCount": 7}, format="json")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data, {"sensorId": "S-001", "hotCount": 7, "coldCount": 2})
+        sql = " ".join(q["sql"] for q in ctx.captured_queries)
+        self.assertNotIn("created_at", sql)
+        self.assertNotIn(connection.ops.quote_name("window"), sql)
+        fb.refresh_from_db()
+        self.assertEqual(fb.hot_count, 7)
+        self.assertEqual(fb.window, timedelta(minutes=15))
+
+    def test_feedback_bulk_apply(self):
+        fb1, fb2 = Feedback.objects.order_by("sensor__sensor_id")
+        version = cache.get_or_set(OVERVIEW_VERSION_KEY, 1, None)
+        updates = [
+            {"id": fb1.pk, "hotCount": 5},
+            {"id": fb2.pk, "sensorId": "S-001", "coldCount": 8},
+        ]
+        # Feedback、Sensor 各一条 SELECT，与条数无关；写回一条 UPDATE
+        with CaptureQueriesContext(connection) as ctx:
+            FeedbackSerializer.bulk_apply(updates)
+        selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 2)
+        fb1.refresh_from_db()
+        fb2.refresh_from_db()
+        self.assertEqual(fb1.hot_count, 5)
+        self.assertEqual((fb2.sensor_id, fb2.cold_count), (self.s1.pk, 8))
+        # 不经过信号，overview 版本号仍须变化
+        self.assertNotEqual(cache.get(OVERVIEW_VERSION_KEY), version)
+
+    def test_feedback_bulk_apply_rejects_bad_items(self):
+        fb = Feedback.objects.get(sensor=self.s1)
+        cases = [
+            ([{"id": fb.pk, "sensorId": "S-404"}], "sensorId"),
+            ([{"id": 999999, "hotCount": 1}], "id"),
+            ([{"hotCount": 1}], "id"),
+        ]
+        for updates, field in cases:
+            with self.subTest(updates=updates), self.assertRaises(ValidationError) as cm:
+                FeedbackSerializer.bulk_apply([{"id": fb.pk, "hotCount": 9}] + updates)
+            self.assertIn(field, cm.exception.detail)
+        with self.assertRaises(ValidationError):
+            FeedbackSerializer.bulk_apply([{"id": fb.pk, "hotCount": 9}, 1])
+        # 整批校验失败时不写入任何一条
+        fb.refresh_from_db()
+        self.assertEqual(fb.hot_count, 1)
+
+    def test_feedback_put_loads_dotted_sources_in_one_query(self):
+        # only() 与 select_related 都由 Serializer 的 source 推导：跨表列随 JOIN 取回，不再单独查询
+        fb = Feedback.objects.get(sensor=self.s1)
+        with self.assertNumQueries(2):  # SELECT（含 JOIN）+ UPDATE
+            resp = self.client.put(f"/api/feedback/{fb.pk}", {"coldCount": 3}, format="json")
+        self.assertEqual(resp.data["sensorId"], "S-001")
+
+    def test_only_for_skips_non_column_sources(self):
+        # pk / 方法 / 关联对象上的属性都不是具体列，不能交给 only()
+        class Ser(FeedbackSerializer):
+            id = serializers.ReadOnlyField(source="pk")
+            label = serializers.ReadOnlyField(source="__str__")
+            sensorPk = serializers.ReadOnlyField(source="sensor.pk")
+
+            class Meta(FeedbackSerializer.Meta):
+                fields = FeedbackSerializer.Meta.fields + ("id", "label", "sensorPk")
+
+        qs = select_related_for(only_for(Feedback.objects.all(), Ser), Ser)
+        self.assertEqual(len(Ser(qs, many=True).data), 2)
+
+    def test_list_payloads_match_serializer_fields(self):
+        # 列表接口绕开了 ModelSerializer，输出字段须与其声明保持一致
+        cases = [
+            ("/api/sensors", SensorSerializer),
+            ("/api/health", SensorHealthSerializer),
+        ]
+        for url, ser in cases:
+            with self.subTest(url=url):
+                row = self.client.get(url).data["results"][0]
+                self.assertEqual(tuple(row), ser.Meta.fields)
+        self.assertEqual(tuple(self.client.get("/api/map").json()["map"]), MapAssetSerializer.Meta.fields)
+
+    def test_wire_format(self):
+        # ORJSONRenderer：时间格式须与 REST_FRAMEWORK["DATETIME_FORMAT"] 一致
+        resp = self.client.get("/api/sensors")
+        self.assertEqual(resp["Content-Type"], "application/json")
+        body = resp.json()
+        self.assertEqual(body["results"][0]["lastSeenAt"], self.s1.last_seen_at.strftime("%Y-%m-%dT%H:%M:%SZ"))
+
     def test_health_list(self):
         url = "/api/health"
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 2)
+        self.assertEqual(len(resp.data["results"]), 2)
         # 字段风格
-        self.assertIn("sensorId", resp.data[0])
-        self.assertIn("latencySec", resp.data[0])
+        self.assertIn("sensorId", resp.data["results"][0])
+        self.assertIn("latencySec", resp.data["results"][0])
 
     def test_health_aggregate(self):
         url = "/api/health?aggregate=true"
@@ -116,6 +287,16 @@ class APISmokeTests(APITestCase):
         self.assertEqual(resp.data["counts"]["connected"], 1)
         self.assertEqual(resp.data["counts"]["disconnected"], 1)
 
+    def test_health_aggregate_flag_variants(self):
+        for flag in ("TRUE", "yes", "On", "1"):
+            with self.subTest(flag=flag):
+                resp = self.client.get(f"/api/health?aggregate={flag}")
+                self.assertIn("counts", resp.data)
+
+    def test_sensors_updated_within_rejects_non_integer(self):
+        resp = self.client.get("/api/sensors?updatedWithin=abc")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_feedback_auto_aggregate_without_global(self):
         # 未创建全局反馈时，应自动聚合各传感器“最新一条”
         url = "/api/feedback"
@@ -128,25 +309,115 @@ class APISmokeTests(APITestCase):
         self.assertEqual(resp.data["hotCount"], 1)
         self.assertEqual(resp.data["window"]["minutes"], 15)  # 默认
 
+    def test_feedback_aggregate_uses_latest_row_per_sensor(self):
+        # 更早的记录不参与求和；SUM/SUM/MAX 在同一条 SQL 里完成
+        Feedback.objects.create(
+            sensor=self.s1, cold_count=50, hot_count=50,
+            updated_at=self.now - timedelta(minutes=5),
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get("/api/feedback")
+        self.assertEqual(resp.data["coldCount"], 3)
+        self.assertEqual(resp.data["hotCount"], 1)
+        agg_sql = [q["sql"] for q in ctx.captured_queries if "SUM(" in q["sql"].upper()]
+        self.assertEqual(len(agg_sql), 1)
+        self.assertEqual(agg_sql[0].upper().count("SUM("), 2)
+        self.assertIn("MAX(", agg_sql[0].upper())
+
+    def test_feedback_window_param(self):
+        # 两条传感器反馈都早于 1 分钟窗口，不参与聚合
+        resp = self.client.get("/api/feedback?window=1")
+        self.assertEqual(resp.data["window"]["minutes"], 1)
+        self.assertEqual(resp.data["coldCount"], 0)
+        resp = self.client.get("/api/feedback?window=99999")
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("window", resp.data["error"]["message"])
+
     def test_feedback_global_preferred(self):
         # 有全局聚合则优先生效
         Feedback.objects.create(
             sensor=None, cold_count=9, hot_count=9, updated_at=self.now
         )
         url = "/api/feedback"
-        resp = self.client.get(url)
+        with self.assertNumQueries(1):  # 全局反馈一条 SQL 取回，不再做聚合
+            resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         self.assertEqual(resp.data["coldCount"], 9)
         self.assertEqual(resp.data["hotCount"], 9)
+        self.assertEqual(resp.data["window"]["minutes"], 15)
 
     def test_overview_bundle(self):
         url = "/api/overview"
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertIn("map", resp.data)
-        self.assertIn("sensors", resp.data)
-        self.assertIn("health", resp.data)
-        self.assertIn("feedback", resp.data)
+        data = resp.json()  # 预渲染字节，不是 DRF Response
+        self.assertIn("map", data)
+        self.assertIn("sensors", data)
+        self.assertIn("health", data)
+        self.assertIn("feedback", data)
         # 坐标元数据
-        self.assertIn("coordinateMeta", resp.data)
-        self.assertEqual(resp.data["coordinateMeta"]["yAxis"], "down")
+        self.assertIn("coordinateMeta", data)
+        self.assertEqual(data["coordinateMeta"]["yAxis"], "down")
+        # 传感器/健康由一条 JOIN 拆出，须与各自列表接口逐条一致
+        self.assertEqual(data["sensors"], self.client.get("/api/sensors").json()["results"])
+        self.assertEqual(data["health"], self.client.get("/api/health").json()["results"])
+
+    def test_overview_skips_sensors_without_health(self):
+        Sensor.objects.create(sensor_id="S-003", x=0.5, y=0.5, temperature_c=24.0, last_seen_at=self.now)
+        data = self.client.get("/api/overview").json()
+        self.assertEqual([s["sensorId"] for s in data["sensors"]], ["S-001", "S-002", "S-003"])
+        self.assertEqual([h["sensorId"] for h in data["health"]], ["S-001", "S-002"])
+
+    # 查询次数钉住：防止 N+1 / 多余往返悄悄回来
+    def test_query_counts(self):
+        cases = [
+            ("/api/map", 1),
+            ("/api/sensors", 2),  # 分页：COUNT + 当前页
+            ("/api/health", 2),
+            ("/api/health?aggregate=true", 1),
+            ("/api/feedback", 2),  # 全局反馈探测（无）+ 聚合
+        ]
+        for url, n in cases:
+            with self.subTest(url=url), self.assertNumQueries(n):
+                self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_query_counts_do_not_grow_with_rows(self):
+        for i in range(3, 13):
+            s = Sensor.objects.create(
+                sensor_id=f"S-{i:03d}", x=0.5, y=0.5, temperature_c=24.0,
+                last_seen_at=self.now,
+            )
+            SensorHealth.objects.create(sensor=s, status="connected", last_seen_at=self.now, latency_sec=1)
+            Feedback.objects.create(sensor=s, cold_count=1, hot_count=1, updated_at=self.now)
+        with self.assertNumQueries(2):
+            self.client.get("/api/health")
+        with self.assertNumQueries(2):
+            self.client.get("/api/feedback")
+
+    def test_overview_query_counts(self):
+        # 冷启动：地图 + 传感器/健康(一条 JOIN) + 反馈(2)；版本号在 cache 里，不查库
+        with self.assertNumQueries(4):
+            self.client.get("/api/overview")
+        # 数据未变：直接返回缓存字节
+        with self.assertNumQueries(0):
+            resp = self.client.get("/api/overview")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.json()["coordinateMeta"]["yAxis"], "down")
+
+    def test_overview_ignores_process_local_global_feedback_memo(self):
+        self.client.get("/api/feedback")  # 本进程缓存“无全局反馈”
+        # 模拟共享缓存后端下别的进程写入：bulk_create 不触发信号，本进程缓存未清，
+        # 只有（共享的）版本号变化；LocMemCache 下别的进程无法做到这一步，只能靠 TTL 过期
+        Feedback.objects.bulk_create([Feedback(sensor=None, cold_count=7, hot_count=3, updated_at=self.now)])
+        bump_overview_version()
+        data = self.client.get("/api/overview").json()
+        self.assertEqual(data["feedback"]["coldCount"], 7)
+
+    def test_overview_refreshes_after_put(self):
+        self.client.get("/api/overview")  # 预热缓存
+        fb = Feedback.objects.get(sensor=self.s2)
+        self.client.put(f"/api/feedback/{fb.pk}", {"coldCount": 42}, format="json")
+        self.client.put("/api/sensors/S-001", {"temperatureC": 30.0}, format="json")
+        data = self.client.get("/api/overview").json()
+        self.assertEqual(data["feedback"]["coldCount"], 44)
+        self.assertEqual(data["sensors"][0]["temperatureC"], 30.0)
@@ -46,8 +46,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",   # 放在最前面，至少在 CommonMiddleware 之前
-    "django.middleware.security.SecurityMiddleware",
-    "django.middleware.common.CommonMiddleware",
+    # 响应压缩：需排在其他读写响应体的中间件之前；JSON 列表/总览重复键多，压缩比高
+    # 如需 brotli 可换用 django-compression-middleware 的 CompressionMiddleware
+    "django.middleware.gzip.GZipMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +93,26 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # 持久连接：跨请求复用，省去每次建连；复用前先做健康检查，避免拿到断开的连接
+        # 换成 PostgreSQL（psycopg3, Django 5.1+）时可改用 "OPTIONS": {"pool": True}
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# 地图 / overview 等接口的缓存及其版本号；LocMemCache 按进程隔离，跨进程的写入要等 TTL 过期才可见
+# 多进程部署请换成共享后端，例如
+#   "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+#   "LOCATION": "127.0.0.1:11211",
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "temp-backend",
+        "TIMEOUT": 300,
     }
 }
 
@@ -139,9 +160,11 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": ["rest_framework.renderers.JSONRenderer"],
+    "DEFAULT_RENDERER_CLASSES": ["main.renderers.ORJSONRenderer"],  # orjson：C 实现的 JSON 编码
     "DEFAULT_PARSER_CLASSES": ["rest_framework.parsers.JSONParser"],
     "EXCEPTION_HANDLER": "main.api.exception_handler",  # 自定义错误格式
     "DATETIME_FORMAT": "%Y-%m-%dT%H:%M:%SZ",            # 统一 ISO8601 Z
+    "DEFAULT_PAGINATION_CLASS": "main.pagination.BoundedLimitOffsetPagination",  # ?limit= 上限 1000
+    "PAGE_SIZE": 100,                                    # 列表接口默认每页条数
 }
 